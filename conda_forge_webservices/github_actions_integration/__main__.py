@@ -83,6 +83,10 @@ def main_run_task(task, repo, pr_number, task_data_dir, requested_version, sha):
     git_repo.git.switch(f"pull/{pr_number}/head")
     prev_head = git_repo.active_branch.commit.hexsha
 
+    # batched lint jobs do not pass a sha, so we use the head of the PR
+    if task == "lint" and (sha is None or sha.lower() in ["null", "none"]):
+        sha = prev_head
+
     task_data = {
         "task": task,
         "repo": repo,
@@ -1,11 +1,22 @@
+import datetime
 import os
+import time
 import tempfile
+import threading
 import subprocess
+from unittest import mock
 
+import github
 import pytest
+import requests
 
+from .. import tokens
 from ..tokens import (
+    _ETagHTTPSRequestsConnection,
+    _TokenCache,
+    _get_gh_client,
     generate_app_token_for_feedstock,
+    generate_app_token_for_webservices_only,
     inject_app_token_into_feedstock,
     inject_app_token_into_feedstock_readonly,
     get_app_token_for_webservices_only,
@@ -56,18 +67,177 @@ def test_github_app_tokens_for_webservices_cache():
     assert token_again == token
 
 
+def test_token_cache(tmp_path):
+    cache = _TokenCache(str(tmp_path / "cache" / "tokens.json"))
+    now = time.time()
+    assert cache.get("__app__", now) == (None, None)
+
+    cache.set("__app__", "abc", now + 3600)
+    cache.set("expired", "def", now - 1)
+    assert cache.get("__app__", now) == ("abc", now + 3600)
+    assert cache.get("__app__", now + 3600) == (None, None)
+
+    # expired entries are dropped on the next write
+    cache.set("foo", "ghi", now + 60)
+    assert "expired" not in _TokenCache(cache.path)._read()
+    assert cache.get("foo", now) == ("ghi", now + 60)
+
+    # the token can be left out
+    cache.set("bar", None, now + 60)
+    assert cache.get("bar", now) == (None, now + 60)
+    assert "token" not in _TokenCache(cache.path)._read()["bar"]
+
+
+@pytest.mark.parametrize(
+    "contents",
+    [
+        "[1, 2]",
+        '{"__app__": {"token": "abc"}}',
+        '{"__app__": "abc"}',
+        '{"__app__": {"token": 1, "expires_at": 1}}',
+        "{",
+    ],
+)
+def test_token_cache_malformed(tmp_path, contents):
+    cache = _TokenCache(str(tmp_path / "tokens.json"))
+    with open(cache.path, "w") as fp:
+        fp.write(contents)
+
+    now = time.time()
+    assert cache.get("__app__", now) == (None, None)
+
+    # the malformed file is replaced on the next write
+    cache.set("__app__", "abc", now + 3600)
+    assert cache.get("__app__", now) == ("abc", now + 3600)
+
+
+def _make_response(status, body, headers):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = body.encode()
+    resp.headers.update(headers)
+    return resp
+
+
+def test_etag_connection():
+    cnx = _ETagHTTPSRequestsConnection("api.github.com")
+    responses = [
+        _make_response(200, '{"a": 1}', {"ETag": '"abc"', "X-RateLimit-Used": "1"}),
+        _make_response(304, "", {"X-RateLimit-Used": "1"}),
+        _make_response(200, '{"a": 1}', {"ETag": '"def"', "X-RateLimit-Used": "2"}),
+    ]
+    with mock.patch.object(cnx.session, "get", side_effect=responses) as get:
+        cnx.request("GET", "/test-etag", None, {"Authorization": "token a"})
+        assert cnx.getresponse().read() == '{"a": 1}'
+        assert "If-None-Match" not in get.call_args.kwargs["headers"]
+
+        cnx.request("GET", "/test-etag", None, {"Authorization": "token a"})
+        resp = cnx.getresponse()
+        assert get.call_args.kwargs["headers"]["If-None-Match"] == '"abc"'
+        assert resp.status == 200
+        assert resp.read() == '{"a": 1}'
+
+        # responses are never shared between tokens
+        cnx.request("GET", "/test-etag", None, {"Authorization": "token b"})
+        cnx.getresponse()
+        assert "If-None-Match" not in get.call_args.kwargs["headers"]
+
+
+def test_etag_cache_cleared_for_new_token():
+    _get_gh_client("token-a")
+    _ETagHTTPSRequestsConnection._cache["foo"] = ("abc", None)
+
+    # the same token keeps the cache
+    _get_gh_client("token-a")
+    assert "foo" in _ETagHTTPSRequestsConnection._cache
+
+    _get_gh_client("token-b")
+    assert "foo" not in _ETagHTTPSRequestsConnection._cache
+
+
+def test_etag_connection_without_stream():
+    # older versions of PyGithub only set these attributes in request
+    cnx = _ETagHTTPSRequestsConnection("api.github.com")
+    cnx.verb = "GET"
+    cnx.url = "/test-etag-no-stream"
+    cnx.input = None
+    cnx.headers = {"Authorization": "token a"}
+    assert not hasattr(cnx, "stream")
+
+    resp = _make_response(200, '{"a": 1}', {"ETag": '"abc"'})
+    with mock.patch.object(cnx.session, "get", return_value=resp):
+        assert cnx.getresponse().read() == '{"a": 1}'
+
+
+def test_locks_reset_after_fork():
+    with tokens._APP_TOKEN_LOCK:
+        pid = os.fork()
+        if pid == 0:
+            # the lock is held by the parent so this would block without the reset
+            os._exit(0 if tokens._APP_TOKEN_LOCK.acquire(timeout=5) else 1)
+        _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def _make_integration(installation_id, token_data):
+    def _get_access_token(_installation_id, **kwargs):
+        if _installation_id != installation_id:
+            raise github.UnknownObjectException(404)
+        return token_data
+
+    integration = mock.MagicMock()
+    integration.get_org_installation.return_value.id = installation_id
+    integration.get_repo_installation.return_value.id = installation_id
+    integration.get_access_token.side_effect = _get_access_token
+    return integration
+
+
+@pytest.mark.parametrize("feedstock", [True, False])
+def test_github_app_tokens_stale_installation_id(feedstock):
+    expires_at = datetime.datetime.now(datetime.timezone.utc)
+    token_data = mock.MagicMock(
+        token="abc",
+        expires_at=expires_at,
+        permissions=tokens._FEEDSTOCK_TOKEN_PERMISSIONS[False],
+        repository_selection="selected",
+        raw_data={"repositories": [{"name": "foo-feedstock"}]},
+    )
+    integration = _make_integration(2, token_data)
+
+    with (
+        mock.patch.dict(tokens._ORG_INSTALLATION_IDS, {"123": 1}),
+        mock.patch.object(tokens, "_get_app_auth"),
+        mock.patch.object(
+            tokens,
+            "_get_integration",
+            return_value=(integration, threading.Lock()),
+        ),
+    ):
+        if feedstock:
+            res = generate_app_token_for_feedstock("123", b"pem", "foo-feedstock")
+        else:
+            res = generate_app_token_for_webservices_only("123", b"pem")
+        assert res == ("abc", expires_at.timestamp())
+        assert tokens._ORG_INSTALLATION_IDS["123"] == 2
+
+    # the stale ID was tried first and then the new one
+    assert [c.args[0] for c in integration.get_access_token.call_args_list] == [1, 2]
+
+
 @pytest.mark.parametrize(
     "token_repo", ["staged-recipes", "cf-autotick-bot-test-package-feedstock"]
 )
 def test_github_app_tokens_for_feedstocks(token_repo):
     app_id = os.environ["CF_WEBSERVICES_FEEDSTOCK_APP_ID"]
     raw_pem = os.environ["CF_WEBSERVICES_FEEDSTOCK_PRIVATE_KEY"].encode()
-    token = generate_app_token_for_feedstock(
+    token, expires_at = generate_app_token_for_feedstock(
         app_id,
         raw_pem,
         token_repo,
     )
     assert token is not None
+    assert expires_at is not None
+    assert expires_at > time.time()
     repo = "cf-autotick-bot-test-package-feedstock"
 
     with tempfile.TemporaryDirectory() as tmpdir:
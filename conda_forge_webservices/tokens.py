@@ -1,32 +1,266 @@
 import time
 import base64
+import fcntl
+import hashlib
+import json
 import os
 import io
 import sys
 import logging
-from contextlib import redirect_stdout, redirect_stderr
+import tempfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
 from functools import lru_cache
 
 from typing import Any
 
+import cachetools
 from github import (
     Auth,
     Github,
     GithubIntegration,
     GithubException,
+    UnknownObjectException,
 )
 from github.InstallationAuthorization import InstallationAuthorization
+from github.Requester import HTTPSRequestsConnectionClass, RequestsResponse
+from requests.structures import CaseInsensitiveDict
 
 LOGGER = logging.getLogger("conda_forge_webservices.tokens")
 
 FEEDSTOCK_TOKEN_RESET_TIMES: dict[str, Any] = {}
 READONLY_FEEDSTOCK_TOKEN_RESET_TIMES: dict[str, Any] = {}
+APP_TOKEN: str | None = None
 APP_TOKEN_RESET_TIME = None
 
+# the environment is fixed for the lifetime of the process in GitHub Actions
+_IN_GHA: bool = os.environ.get("GITHUB_ACTIONS") == "true"
+
+# PyGithub output is hidden where logs are public or when asked to so that
+# secrets do not leak into them
+_SUPPRESS_STDIO: bool = (
+    _IN_GHA or os.environ.get("CF_SUPPRESS_PYGITHUB_STDIO", "0") == "1"
+)
+
+# parsed app auth objects keyed on (app id, hash of the raw private key)
+_APP_AUTH_CACHE: dict[tuple[str, bytes], Auth.AppAuth] = {}
+
+# installation IDs of each app on the conda-forge org keyed on app id
+_ORG_INSTALLATION_IDS: dict[str, int] = {}
+
+# permissions of the feedstock tokens keyed on whether they are readonly
+_FEEDSTOCK_TOKEN_PERMISSIONS: dict[bool, dict[str, str]] = {
+    readonly: {
+        "actions": read_or_write,
+        "checks": read_or_write,
+        "contents": read_or_write,
+        "issues": read_or_write,
+        "metadata": "read",
+        "pull_requests": read_or_write,
+        "statuses": read_or_write,
+        "workflows": read_or_write,
+    }
+    for readonly, read_or_write in [(False, "write"), (True, "read")]
+}
+
+# only one thread at a time makes a new token, per feedstock for the
+# feedstock tokens, so that concurrent requests do not each make one
+_APP_TOKEN_LOCK = threading.Lock()
+_FEEDSTOCK_TOKEN_LOCKS: defaultdict[str, threading.Lock] = defaultdict(threading.Lock)
+
+# github integrations keyed on (integration class, app auth) so that their
+# HTTP sessions and connection pools are reused between token generations,
+# each with a lock since PyGithub connections cannot be used concurrently
+_INTEGRATION_CACHE: dict[
+    tuple[type, Auth.AppAuth], tuple[GithubIntegration, threading.Lock]
+] = {}
+_INTEGRATION_LOCK = threading.Lock()
+
+_BANNER = "=" * 51
+
+
+def _log_block(msg, *args):
+    """Log a message between two banner lines as a single log record."""
+    LOGGER.info("\n%s\n" + msg + "\n%s", _BANNER, *args, _BANNER)
+
+
+@contextmanager
+def _suppress_stdio():
+    if _SUPPRESS_STDIO:
+        f = io.StringIO()
+        with redirect_stdout(f), redirect_stderr(f):
+            yield
+    else:
+        yield
+
+
+class _TokenCache:
+    """A small on-disk cache of tokens shared between processes.
+
+    Entries are stored as ``{key: {"token": ..., "expires_at": ...}}`` in a
+    JSON file, where the token is left out of entries that only need to
+    record when a token expires. Access is guarded by ``flock`` on a separate
+    lock file and writes are made atomic via a temporary file and
+    ``os.replace``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + ".lock"
+
+    def _read(self):
+        try:
+            with open(self.path) as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+        # anything malformed is treated as a miss and overwritten on the next write
+        if not isinstance(data, dict):
+            return {}
+        return {
+            key: entry
+            for key, entry in data.items()
+            if isinstance(entry, dict)
+            and isinstance(entry.get("expires_at"), int | float)
+            and isinstance(entry.get("token", ""), str)
+        }
+
+    def get(self, key, min_expires_at):
+        """Get a token and its expiry time if it expires after `min_expires_at`.
+
+        Returns ``(None, None)`` if there is no such token. The token is None
+        for entries stored without one.
+        """
+        try:
+            with open(self.lock_path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_SH)
+                entry = self._read().get(key)
+        except OSError:
+            entry = None
+
+        if entry is None or entry["expires_at"] <= min_expires_at:
+            return None, None
+        else:
+            return entry.get("token"), entry["expires_at"]
+
+    def set(self, key, token, expires_at):
+        """Store a token and its expiry time, dropping any expired entries.
+
+        Pass None as the token to store only the expiry time.
+        """
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.lock_path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                now = time.time()
+                data = {k: v for k, v in self._read().items() if v["expires_at"] > now}
+                data[key] = {"expires_at": expires_at}
+                if token is not None:
+                    data[key]["token"] = token
+
+                # mkstemp makes the file readable only by the current user
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(self.path), suffix=".tmp"
+                )
+                try:
+                    with os.fdopen(fd, "w") as fp:
+                        json.dump(data, fp)
+                    os.replace(tmp_path, self.path)
+                except Exception:
+                    os.unlink(tmp_path)
+                    raise
+        except OSError:
+            LOGGER.warning("could not write token cache %s", self.path, exc_info=True)
+
+
+_TOKEN_CACHE = _TokenCache(
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+        "cf-webservices-tokens.json",
+    )
+)
+
+
+class _ETagRequestsResponse(RequestsResponse):
+    """A cached response returned in place of a 304 Not Modified response."""
+
+    def __init__(self, cached, not_modified):
+        # copy the attributes since they differ between PyGithub versions,
+        # e.g. older ones keep the text of the response instead of the response
+        self.__dict__.update(cached.__dict__)
+        # keep the rate limit headers etc. from the new response
+        self.headers = CaseInsensitiveDict(cached.headers)
+        self.headers.update(not_modified.headers)
+
+
+class _ETagHTTPSRequestsConnection(HTTPSRequestsConnectionClass):
+    """A PyGithub connection that makes conditional GET requests.
+
+    GitHub does not count 304 Not Modified responses against the rate limit,
+    so we keep the ETag and response of each GET request and send it back
+    via ``If-None-Match`` when the same URL is requested again.
+    """
+
+    # shared between connections and keyed on the auth header so that
+    # responses are never handed to a different token
+    _cache: cachetools.LRUCache = cachetools.LRUCache(maxsize=512)
+    _cache_lock = threading.Lock()
+
+    def getresponse(self):
+        # older versions of PyGithub do not set stream
+        if self.verb != "GET" or getattr(self, "stream", False):
+            return super().getresponse()
+
+        key = (
+            self.host,
+            self.url,
+            self.headers.get("Authorization"),
+            self.headers.get("Accept"),
+        )
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            self.headers = {**self.headers, "If-None-Match": cached[0]}
+
+        resp = super().getresponse()
+        if resp.status == 304 and cached is not None:
+            return _ETagRequestsResponse(cached[1], resp)
+
+        etag = resp.headers.get("ETag")
+        if resp.status == 200 and etag:
+            with self._cache_lock:
+                self._cache[key] = (etag, resp)
+
+        return resp
+
+
+def _reset_locks_after_fork():
+    # a forked child gets copies of locks that may be held by threads in the
+    # parent which do not exist in the child, so it would deadlock on them
+    global _APP_TOKEN_LOCK, _FEEDSTOCK_TOKEN_LOCKS, _INTEGRATION_LOCK
+    _APP_TOKEN_LOCK = threading.Lock()
+    _FEEDSTOCK_TOKEN_LOCKS = defaultdict(threading.Lock)
+    _INTEGRATION_LOCK = threading.Lock()
+    # the integrations share their locks and connections with the parent
+    _INTEGRATION_CACHE.clear()
+    _ETagHTTPSRequestsConnection._cache_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
 
 @lru_cache(maxsize=1)
 def _get_gh_client(token):
-    return Github(auth=Auth.Token(token))
+    # responses cached for the previous token can never be used again
+    with _ETagHTTPSRequestsConnection._cache_lock:
+        _ETagHTTPSRequestsConnection._cache.clear()
+
+    gh = Github(auth=Auth.Token(token))
+    # PyGithub has no public way to set the connection class per client
+    gh._Github__requester._Requester__connectionClass = _ETagHTTPSRequestsConnection
+    return gh
 
 
 def get_gh_client():
@@ -36,8 +270,9 @@ def get_gh_client():
 def get_app_token_for_webservices_only():
     """Get's an app token that should only be used in the webservices bot.
 
-    This function caches the token and only returns a new one when the current
-    one is expired or about to expire in the next minute.
+    This function caches the token, in memory and on disk so that it is shared
+    between processes, and only returns a new one when the current one is
+    expired or about to expire in the next minute.
 
     Returns
     -------
@@ -52,40 +287,93 @@ def get_app_token_for_webservices_only():
     now = time.time()
     now_plus_1min = now + 60
     if APP_TOKEN_RESET_TIME is None or APP_TOKEN_RESET_TIME <= now_plus_1min:
-        token = generate_app_token_for_webservices_only(
-            os.environ["CF_WEBSERVICES_APP_ID"],
-            os.environ["CF_WEBSERVICES_PRIVATE_KEY"].encode(),
-        )
-        if token is not None:
-            try:
-                APP_TOKEN_RESET_TIME = Github(
-                    auth=Auth.Token(token)
-                ).rate_limiting_resettime
-            except Exception:
-                LOGGER.info("")
-                LOGGER.info("===================================================")
-                LOGGER.info("app token did not generate proper reset time")
-                LOGGER.info("===================================================")
-                token = None
-        else:
-            LOGGER.info("")
-            LOGGER.info("===================================================")
-            LOGGER.info("app token could not be made")
-            LOGGER.info("===================================================")
-
-        APP_TOKEN = token
+        with _APP_TOKEN_LOCK:
+            # another thread may have made a new token while we waited
+            if APP_TOKEN_RESET_TIME is None or APP_TOKEN_RESET_TIME <= now_plus_1min:
+                app_id = os.environ["CF_WEBSERVICES_APP_ID"]
+                cache_key = f"__app__:{app_id}"
+                token, expires_at = _TOKEN_CACHE.get(cache_key, now_plus_1min)
+                if token is None:
+                    token, expires_at = generate_app_token_for_webservices_only(
+                        app_id,
+                        os.environ["CF_WEBSERVICES_PRIVATE_KEY"].encode(),
+                    )
+                    if token is not None:
+                        _TOKEN_CACHE.set(cache_key, token, expires_at)
+
+                # set the token before the reset time since readers
+                # check the reset time without holding the lock
+                APP_TOKEN = token
+                if token is not None:
+                    APP_TOKEN_RESET_TIME = expires_at
+                else:
+                    _log_block("app token could not be made")
     else:
-        LOGGER.info("")
-        LOGGER.info("===================================================")
-        LOGGER.info(
+        _log_block(
             "app token exists - timeout %sm",
             (APP_TOKEN_RESET_TIME - now) / 60,
         )
-        LOGGER.info("===================================================")
 
-    assert APP_TOKEN is not None, "app token is None!"
+    token = APP_TOKEN
+    assert token is not None, "app token is None!"
+
+    return token
+
+
+def _get_app_auth(app_id, raw_pem):
+    """Get the github app auth object for an app ID and private key.
 
-    return APP_TOKEN
+    The decoded key and auth object are cached so that repeated token
+    generations do not redo the work.
+
+    Parameters
+    ----------
+    app_id : str
+        The github app ID.
+    raw_pem : bytes
+        An app private key as bytes.
+
+    Returns
+    -------
+    gh_auth : github.Auth.AppAuth
+        The github app auth object.
+    """
+    key = (app_id, hashlib.blake2b(raw_pem, digest_size=16).digest())
+    if key in _APP_AUTH_CACHE:
+        return _APP_AUTH_CACHE[key]
+
+    # PyGithub output may be silenced but our messages go to the real stdout
+    stdout = sys.stdout
+    with _suppress_stdio():
+        if not raw_pem.lstrip().startswith(b"-----BEGIN"):
+            raw_pem = base64.b64decode(raw_pem)
+            if _IN_GHA:
+                print("base64 decoded PEM", file=stdout, flush=True)
+                print(f"::add-mask::{raw_pem}", file=stdout, flush=True)
+
+        if isinstance(raw_pem, bytes):
+            raw_pem = raw_pem.decode()
+            if _IN_GHA:
+                print("utf-8 decoded PEM", file=stdout, flush=True)
+                print(f"::add-mask::{raw_pem}", file=stdout, flush=True)
+
+        gh_auth = Auth.AppAuth(app_id=app_id, private_key=raw_pem)
+        if _IN_GHA:
+            print("loaded Github Auth", file=stdout, flush=True)
+
+    _APP_AUTH_CACHE[key] = gh_auth
+    return gh_auth
+
+
+def _get_integration(integration_cls, gh_auth):
+    key = (integration_cls, gh_auth)
+    with _INTEGRATION_LOCK:
+        if key not in _INTEGRATION_CACHE:
+            _INTEGRATION_CACHE[key] = (
+                integration_cls(auth=gh_auth),
+                threading.Lock(),
+            )
+        return _INTEGRATION_CACHE[key]
 
 
 def generate_app_token_for_webservices_only(app_id, raw_pem):
@@ -102,68 +390,56 @@ def generate_app_token_for_webservices_only(app_id, raw_pem):
     -------
     gh_token : str
         The github token. May return None if there is an error.
+    expires_at : float
+        The UNIX timestamp at which the token expires. May return None if
+        there is an error.
     """
-    if "GITHUB_ACTIONS" in os.environ and os.environ["GITHUB_ACTIONS"] == "true":
-        sys.stdout.flush()
-        print(
-            "running in GitHub Actions",
-            flush=True,
-        )
+    if _IN_GHA:
+        print("running in GitHub Actions", flush=True)
         print(f"::add-mask::{raw_pem}", flush=True)
 
     try:
-        f = io.StringIO()
-        if raw_pem[0:1] != b"-":
-            with redirect_stdout(f), redirect_stderr(f):
-                raw_pem = base64.b64decode(raw_pem)
-            if (
-                "GITHUB_ACTIONS" in os.environ
-                and os.environ["GITHUB_ACTIONS"] == "true"
-            ):
-                sys.stdout.flush()
-                print("base64 decoded PEM", flush=True)
-                print(f"::add-mask::{raw_pem}", flush=True)
-
-        if isinstance(raw_pem, bytes):
-            with redirect_stdout(f), redirect_stderr(f):
-                raw_pem = raw_pem.decode()
-            if (
-                "GITHUB_ACTIONS" in os.environ
-                and os.environ["GITHUB_ACTIONS"] == "true"
-            ):
-                sys.stdout.flush()
-                print("utf-8 decoded PEM", flush=True)
-                print(f"::add-mask::{raw_pem}", flush=True)
-
-        with redirect_stdout(f), redirect_stderr(f):
-            gh_auth = Auth.AppAuth(app_id=app_id, private_key=raw_pem)
-        if "GITHUB_ACTIONS" in os.environ and os.environ["GITHUB_ACTIONS"] == "true":
-            sys.stdout.flush()
-            print("loaded Github Auth", flush=True)
-
-        with redirect_stdout(f), redirect_stderr(f):
-            integration = GithubIntegration(auth=gh_auth)
-        if "GITHUB_ACTIONS" in os.environ and os.environ["GITHUB_ACTIONS"] == "true":
-            sys.stdout.flush()
-            print("loaded Github Integration", flush=True)
+        gh_auth = _get_app_auth(app_id, raw_pem)
+
+        stdout = sys.stdout
+        with _suppress_stdio():
+            integration, integration_lock = _get_integration(GithubIntegration, gh_auth)
+            if _IN_GHA:
+                print("loaded Github Integration", file=stdout, flush=True)
+
+            with integration_lock:
+                gh_token_data = None
+                installation_id = _ORG_INSTALLATION_IDS.get(app_id)
+                if installation_id is not None:
+                    try:
+                        gh_token_data = integration.get_access_token(installation_id)
+                    except UnknownObjectException:
+                        # the app was reinstalled so the cached ID is stale
+                        _ORG_INSTALLATION_IDS.pop(app_id, None)
+
+                if gh_token_data is None:
+                    installation_id = integration.get_org_installation("conda-forge").id
+                    _ORG_INSTALLATION_IDS[app_id] = installation_id
+                    if _IN_GHA:
+                        print("found Github installation", file=stdout, flush=True)
+
+                    gh_token_data = integration.get_access_token(installation_id)
 
-        with redirect_stdout(f), redirect_stderr(f):
-            installation = integration.get_org_installation("conda-forge")
-        if "GITHUB_ACTIONS" in os.environ and os.environ["GITHUB_ACTIONS"] == "true":
-            sys.stdout.flush()
-            print("found Github installation", flush=True)
-
-        with redirect_stdout(f), redirect_stderr(f):
-            gh_token = integration.get_access_token(installation.id).token
-        if "GITHUB_ACTIONS" in os.environ and os.environ["GITHUB_ACTIONS"] == "true":
-            sys.stdout.flush()
-            print("made GITHUB token and masking it for GitHub Actions", flush=True)
-            print(f"::add-mask::{gh_token}", flush=True)
+            gh_token = gh_token_data.token
+            expires_at = gh_token_data.expires_at.timestamp()
+            if _IN_GHA:
+                print(
+                    "made GITHUB token and masking it for GitHub Actions",
+                    file=stdout,
+                    flush=True,
+                )
+                print(f"::add-mask::{gh_token}", file=stdout, flush=True)
 
     except Exception:
         gh_token = None
+        expires_at = None
 
-    return gh_token
+    return gh_token, expires_at
 
 
 def inject_app_token_into_feedstock(full_name, repo=None):
@@ -223,59 +499,56 @@ def _inject_app_token_into_feedstock(full_name, repo=None, readonly=False):
         reset_times_dict = FEEDSTOCK_TOKEN_RESET_TIMES
         token_name = "RERENDERING_GITHUB_TOKEN"
 
-    now = time.time()
-    now_plus_30min = now + 30 * 60
-    if reset_times_dict.get(repo_name, now_plus_30min) <= now_plus_30min:
-        token = generate_app_token_for_feedstock(
-            os.environ["CF_WEBSERVICES_FEEDSTOCK_APP_ID"],
-            os.environ["CF_WEBSERVICES_FEEDSTOCK_PRIVATE_KEY"].encode(),
-            repo_name,
-            readonly=readonly,
-        )
-        if token is not None:
-            if repo is None:
-                gh = get_gh_client()
-                repo = gh.get_repo(full_name)
-            try:
-                repo.create_secret(token_name, token)
-                reset_times_dict[repo_name] = Github(
-                    auth=Auth.Token(token)
-                ).rate_limiting_resettime
-                LOGGER.info("")
-                LOGGER.info("===================================================")
-                LOGGER.info(
-                    "injected app token for repo %s - timeout %sm",
-                    repo_name,
-                    (reset_times_dict[repo_name] - now) / 60,
-                )
-                LOGGER.info("===================================================")
-                worked = True
-            except Exception:
-                LOGGER.info("")
-                LOGGER.info("===================================================")
-                LOGGER.info(
-                    "app token could not be pushed to secrets for %s", repo_name
-                )
-                LOGGER.info("===================================================")
-                worked = False
-
-            return worked
+    cache_key = f"{token_name}:{repo_name}"
+    with _FEEDSTOCK_TOKEN_LOCKS[cache_key]:
+        now = time.time()
+        now_plus_30min = now + 30 * 60
+
+        # another process may have already injected the token
+        if repo_name not in reset_times_dict:
+            _, expires_at = _TOKEN_CACHE.get(cache_key, now_plus_30min)
+            if expires_at is not None:
+                reset_times_dict[repo_name] = expires_at
+
+        if reset_times_dict.get(repo_name, now_plus_30min) <= now_plus_30min:
+            token, expires_at = generate_app_token_for_feedstock(
+                os.environ["CF_WEBSERVICES_FEEDSTOCK_APP_ID"],
+                os.environ["CF_WEBSERVICES_FEEDSTOCK_PRIVATE_KEY"].encode(),
+                repo_name,
+                readonly=readonly,
+            )
+            if token is not None:
+                if repo is None:
+                    gh = get_gh_client()
+                    repo = gh.get_repo(full_name)
+                try:
+                    repo.create_secret(token_name, token)
+                    reset_times_dict[repo_name] = expires_at
+                    # the token is in the repo secrets so only keep its expiry
+                    _TOKEN_CACHE.set(cache_key, None, expires_at)
+                    _log_block(
+                        "injected app token for repo %s - timeout %sm",
+                        repo_name,
+                        (reset_times_dict[repo_name] - now) / 60,
+                    )
+                    worked = True
+                except Exception:
+                    _log_block(
+                        "app token could not be pushed to secrets for %s", repo_name
+                    )
+                    worked = False
+
+                return worked
+            else:
+                _log_block("app token could not be made for %s", repo_name)
+                return False
         else:
-            LOGGER.info("")
-            LOGGER.info("===================================================")
-            LOGGER.info("app token could not be made for %s", repo_name)
-            LOGGER.info("===================================================")
-            return False
-    else:
-        LOGGER.info("")
-        LOGGER.info("===================================================")
-        LOGGER.info(
-            "app token exists for repo %s - timeout %sm",
-            repo_name,
-            (reset_times_dict[repo_name] - now) / 60,
-        )
-        LOGGER.info("===================================================")
-        return True
+            _log_block(
+                "app token exists for repo %s - timeout %sm",
+                repo_name,
+                (reset_times_dict[repo_name] - now) / 60,
+            )
+            return True
 
 
 # see https://github.com/PyGithub/PyGithub/issues/3037 for why we do this
@@ -334,93 +607,78 @@ def generate_app_token_for_feedstock(app_id, raw_pem, repo, readonly=False):
     -------
     gh_token : str
         The github token. May return None if there is an error.
+    expires_at : float
+        The UNIX timestamp at which the token expires. May return None if
+        there is an error.
     """
-    read_or_write = "read" if readonly else "write"
-    permissions = {
-        "actions": read_or_write,
-        "checks": read_or_write,
-        "contents": read_or_write,
-        "issues": read_or_write,
-        "metadata": "read",
-        "pull_requests": read_or_write,
-        "statuses": read_or_write,
-        "workflows": read_or_write,
-    }
+    permissions = _FEEDSTOCK_TOKEN_PERMISSIONS[readonly]
 
-    if "GITHUB_ACTIONS" in os.environ and os.environ["GITHUB_ACTIONS"] == "true":
-        sys.stdout.flush()
-        print(
-            "running in GitHub Actions",
-            flush=True,
-        )
+    if _IN_GHA:
+        print("running in GitHub Actions", flush=True)
         print(f"::add-mask::{raw_pem}", flush=True)
 
     try:
-        f = io.StringIO()
-        if raw_pem[0:1] != b"-":
-            with redirect_stdout(f), redirect_stderr(f):
-                raw_pem = base64.b64decode(raw_pem)
-            if (
-                "GITHUB_ACTIONS" in os.environ
-                and os.environ["GITHUB_ACTIONS"] == "true"
-            ):
-                sys.stdout.flush()
-                print("base64 decoded PEM", flush=True)
-                print(f"::add-mask::{raw_pem}", flush=True)
-
-        if isinstance(raw_pem, bytes):
-            with redirect_stdout(f), redirect_stderr(f):
-                raw_pem = raw_pem.decode()
-            if (
-                "GITHUB_ACTIONS" in os.environ
-                and os.environ["GITHUB_ACTIONS"] == "true"
-            ):
-                sys.stdout.flush()
-                print("utf-8 decoded PEM", flush=True)
-                print(f"::add-mask::{raw_pem}", flush=True)
-
-        with redirect_stdout(f), redirect_stderr(f):
-            gh_auth = Auth.AppAuth(app_id=app_id, private_key=raw_pem)
-        if "GITHUB_ACTIONS" in os.environ and os.environ["GITHUB_ACTIONS"] == "true":
-            sys.stdout.flush()
-            print("loaded Github Auth", flush=True)
-
-        with redirect_stdout(f), redirect_stderr(f):
-            integration = MyGithubIntegration(auth=gh_auth)
-        if "GITHUB_ACTIONS" in os.environ and os.environ["GITHUB_ACTIONS"] == "true":
-            sys.stdout.flush()
-            print("loaded Github Integration", flush=True)
+        gh_auth = _get_app_auth(app_id, raw_pem)
 
-        with redirect_stdout(f), redirect_stderr(f):
-            installation = integration.get_repo_installation("conda-forge", repo)
-        if "GITHUB_ACTIONS" in os.environ and os.environ["GITHUB_ACTIONS"] == "true":
-            sys.stdout.flush()
-            print("found Github installation", flush=True)
-
-        with redirect_stdout(f), redirect_stderr(f):
-            gh_token_data = integration.get_access_token(
-                installation.id,
-                permissions=permissions,
-                repositories=[repo],
+        stdout = sys.stdout
+        with _suppress_stdio():
+            integration, integration_lock = _get_integration(
+                MyGithubIntegration, gh_auth
             )
+            if _IN_GHA:
+                print("loaded Github Integration", file=stdout, flush=True)
+
+            with integration_lock:
+                # the app has a single installation for the whole org, so once we
+                # know its ID we can scope tokens to any repo without looking it up
+                gh_token_data = None
+                installation_id = _ORG_INSTALLATION_IDS.get(app_id)
+                if installation_id is not None:
+                    try:
+                        gh_token_data = integration.get_access_token(
+                            installation_id,
+                            permissions=permissions,
+                            repositories=[repo],
+                        )
+                    except UnknownObjectException:
+                        # the app was reinstalled so the cached ID is stale
+                        _ORG_INSTALLATION_IDS.pop(app_id, None)
+
+                if gh_token_data is None:
+                    installation = integration.get_repo_installation(
+                        "conda-forge", repo
+                    )
+                    _ORG_INSTALLATION_IDS[app_id] = installation.id
+                    if _IN_GHA:
+                        print("found Github installation", file=stdout, flush=True)
+
+                    gh_token_data = integration.get_access_token(
+                        installation.id,
+                        permissions=permissions,
+                        repositories=[repo],
+                    )
 
             assert gh_token_data.permissions == permissions, gh_token_data.permissions
             assert (
                 gh_token_data.repository_selection == "selected"
             ), gh_token_data.repository_selection
-            returned_repos = set(
-                rp["name"] for rp in gh_token_data.raw_data["repositories"]
-            )
-            assert returned_repos == set([repo]), returned_repos
+            returned_repos = gh_token_data.raw_data["repositories"]
+            assert (
+                len(returned_repos) == 1 and returned_repos[0]["name"] == repo
+            ), returned_repos
 
             gh_token = gh_token_data.token
-
-        if "GITHUB_ACTIONS" in os.environ and os.environ["GITHUB_ACTIONS"] == "true":
-            sys.stdout.flush()
-            print("made GITHUB token and masking it for GitHub Actions", flush=True)
-            print(f"::add-mask::{gh_token}", flush=True)
+            expires_at = gh_token_data.expires_at.timestamp()
+            if _IN_GHA:
+                print(
+                    "made GITHUB token and masking it for GitHub Actions",
+                    file=stdout,
+                    flush=True,
+                )
+                print(f"::add-mask::{gh_token}", file=stdout, flush=True)
 
     except Exception:
         gh_token = None
+        expires_at = None
 
-    return gh_token
+    return gh_token, expires_at
@@ -89,6 +89,9 @@ def test_live_automerge(pytestconfig):
                     )
                     pr.add_to_labels("automerge")
 
+                    cfws_repo = gh.get_repo("conda-forge/conda-forge-webservices")
+                    workflow = cfws_repo.get_workflow("automerge.yml")
+
                     print("waiting for the PR to be merged...", flush=True)
                     tot = 0
                     merged = False
@@ -103,10 +106,6 @@ def test_live_automerge(pytestconfig):
                                 break
                             elif tot > 0:
                                 uid = uuid.uuid4().hex
-                                cfws_repo = gh.get_repo(
-                                    "conda-forge/conda-forge-webservices"
-                                )
-                                workflow = cfws_repo.get_workflow("automerge.yml")
                                 workflow.create_dispatch(
                                     ref=branch,
                                     inputs={
@@ -1,158 +1,211 @@
+import json
 import os
 import time
 import uuid
 
 import github
+import requests
 
 import conda_forge_webservices
 from conda_forge_webservices.utils import get_workflow_run_from_uid
 from conda_forge_webservices.github_actions_integration.linting import set_pr_status
 
-TEST_CASES = [
-    (
-        733,
+LINTER_CONTEXT = "conda-forge-linter"
+LINTER_COMMENT_MARKER = (
+    "Hi! This is the friendly automated conda-forge-linting service."
+)
+
+# PR number -> (expected linter status, expected messages in the comment)
+TEST_CASES: dict[int, tuple[str, tuple[str, ...]]] = {
+    733: (
         "failure",
-        [
-            "failed to even lint the recipe",
-        ],
+        ("failed to even lint the recipe",),
     ),
-    (
-        632,
+    632: (
         "failure",
-        [
+        (
             "and found some lint.",
             "feedstock has no `.ci_support` files and thus will not build any packages",
-        ],
+        ),
     ),
-    (
-        523,
+    523: (
         "failure",
-        [
+        (
             "I was trying to look for recipes to lint for "
             "you, but couldn't find any.",
-        ],
+        ),
     ),
-    (
-        217,
+    217: (
         "success",
-        [
-            "I do have some suggestions for making it better though...",
-        ],
+        ("I do have some suggestions for making it better though...",),
     ),
-    (
-        62,
+    62: (
         "success",
-        [
-            "I do have some suggestions for making it better though...",
-        ],
+        ("I do have some suggestions for making it better though...",),
     ),
-    (
-        57,
+    57: (
         "failure",
-        [
+        (
             "I was trying to look for recipes to lint for you, but it "
             "appears we have a merge conflict.",
-        ],
+        ),
     ),
-    (
-        56,
+    56: (
         "failure",
-        [
+        (
             "I was trying to look for recipes to lint for you, but it appears "
             "we have a merge conflict.",
-        ],
+        ),
     ),
-    (
-        54,
+    54: (
         "success",
-        [
-            "I do have some suggestions for making it better though...",
-        ],
+        ("I do have some suggestions for making it better though...",),
     ),
-    (
-        17,
+    17: (
         "failure",
-        [
-            "and found some lint.",
-        ],
+        ("and found some lint.",),
     ),
-    (
-        16,
+    16: (
         "success",
-        [
-            "and found it was in an excellent condition.",
-        ],
+        ("and found it was in an excellent condition.",),
     ),
-]
+}
+
+
+def _get_lint_results(pr_numbers):
+    """Get the linter status and latest linter comment for each PR.
+
+    Everything is fetched in a single GraphQL query instead of paging through
+    the statuses and comments of each PR with the REST API.
+    """
+    # the head commit's linter status and the last 100 comments of each PR
+    pr_queries = "".join(
+        f"""
+        pr{pr_number}: pullRequest(number: {pr_number}) {{
+            commits(last: 1) {{
+                nodes {{ commit {{ status {{
+                    context(name: "{LINTER_CONTEXT}") {{ state }}
+                }} }} }}
+            }}
+            comments(last: 100) {{ nodes {{ body }} }}
+        }}
+        """
+        for pr_number in pr_numbers
+    )
+    query = f"""
+        query {{
+            repository(owner: "conda-forge", name: "conda-forge-webservices") {{
+                {pr_queries}
+            }}
+        }}
+    """
+
+    headers = {"Authorization": f"Bearer {os.environ['GH_TOKEN']}"}
+    req = requests.post(
+        "https://api.github.com/graphql",
+        json={"query": query},
+        headers=headers,
+    )
+    req.raise_for_status()
+    data = req.json()
+    if "errors" in data:
+        raise ValueError(data["errors"])
+
+    results = {}
+    for pr_number in pr_numbers:
+        pr_data = data["data"]["repository"][f"pr{pr_number}"]
+
+        status = pr_data["commits"]["nodes"][0]["commit"]["status"]
+        if status is not None and status["context"] is not None:
+            state = status["context"]["state"].lower()
+        else:
+            state = None
+
+        # comments are oldest first so search from the end for the latest
+        comment = None
+        for _comment in reversed(pr_data["comments"]["nodes"]):
+            if LINTER_COMMENT_MARKER in _comment["body"]:
+                comment = _comment["body"]
+                break
+
+        results[pr_number] = (state, comment)
+
+    return results
 
 
 def test_linter_pr(pytestconfig):
     branch = pytestconfig.getoption("branch")
+    container_tag = conda_forge_webservices.__version__.replace("+", ".")
 
     gh = github.Github(auth=github.Auth.Token(os.environ["GH_TOKEN"]))
     repo = gh.get_repo("conda-forge/conda-forge-webservices")
 
-    for pr_number, _, _ in TEST_CASES:
-        uid = uuid.uuid4().hex
-        pr = repo.get_pull(pr_number)
-        pr_sha = pr.head.sha
-        workflow = repo.get_workflow("webservices-workflow-dispatch.yml")
-        workflow_ran = workflow.create_dispatch(
-            ref=branch,
-            inputs={
-                "task": "lint",
-                "repo": "conda-forge-webservices",
-                "pr_number": str(pr_number),
-                "container_tag": conda_forge_webservices.__version__.replace("+", "."),
-                "uuid": uid,
-                "sha": pr_sha,
-            },
+    # fetch each PR once and reuse it when checking the results
+    prs = {}
+    for pr_number in TEST_CASES:
+        prs[pr_number] = repo.get_pull(pr_number)
+
+    # lint all of the PRs with a single workflow run
+    uid = uuid.uuid4().hex
+    workflow = repo.get_workflow("webservices-workflow-dispatch.yml")
+    workflow_ran = workflow.create_dispatch(
+        ref=branch,
+        inputs={
+            "task": "lint",
+            "repo": "conda-forge-webservices",
+            "pr_numbers": json.dumps(list(prs)),
+            "container_tag": container_tag,
+            "uuid": uid,
+        },
+    )
+    assert workflow_ran, "Workflow did not run for the PRs!"
+    run = get_workflow_run_from_uid(workflow, uid, branch)
+    if run:
+        target_url = run.html_url
+    else:
+        target_url = None
+    assert target_url is not None
+    print(f"target_url for PRs {list(prs)}: {target_url}", flush=True)
+    for pr in prs.values():
+        set_pr_status(repo, pr.head.sha, "pending", target_url=target_url)
+
+    # the linter sets its status after commenting, so we are done once
+    # every PR has a linter status that is no longer pending
+    print("\nwaiting up to four minutes for the linter to work...", flush=True)
+    remaining = set(TEST_CASES)
+    results = {}
+    start = time.time()
+    delay = 5
+    while remaining and time.time() - start < 240:
+        time.sleep(delay)
+        delay = min(2 * delay, 30)
+        for pr_number, result in _get_lint_results(sorted(remaining)).items():
+            state, _ = result
+            if state is not None and state != "pending":
+                results[pr_number] = result
+                remaining.discard(pr_number)
+        print(
+            f"    waited {time.time() - start:.0f} seconds, "
+            f"{len(remaining)} PRs left to lint",
+            flush=True,
         )
-        assert workflow_ran, f"Workflow did not run for PR {pr_number}!"
-        run = get_workflow_run_from_uid(workflow, uid, branch)
-        if run:
-            target_url = run.html_url
-        else:
-            target_url = None
-        assert target_url is not None
-        print(f"target_url for PR {pr_number}: {target_url}", flush=True)
-        set_pr_status(repo, pr_sha, "pending", target_url=target_url)
-
-    print("\nsleeping for four minutes to let the linter work...", flush=True)
-    tot = 0
-    while tot < 240:
-        time.sleep(10)
-        tot += 10
-        print(f"    slept {tot} seconds out of 240", flush=True)
-
-    for pr_number, expected_status, expected_msgs in TEST_CASES:
-        pr = repo.get_pull(pr_number)
-        commit = repo.get_commit(pr.head.sha)
-
-        status = None
-        for _status in commit.get_statuses():
-            if _status.context == "conda-forge-linter":
-                status = _status
-                break
 
-        assert status is not None
+    # get whatever is there for any PRs that did not finish in time
+    if remaining:
+        results.update(_get_lint_results(sorted(remaining)))
 
-        comment = None
-        for _comment in pr.get_issue_comments():
-            if (
-                "Hi! This is the friendly automated conda-forge-linting service."
-                in _comment.body
-            ):
-                comment = _comment
+    for pr_number, (expected_status, expected_msgs) in TEST_CASES.items():
+        state, comment = results[pr_number]
 
+        assert state is not None
         assert comment is not None
 
-        assert status.state == expected_status, (
+        assert state == expected_status, (
             pr_number,
-            status.state,
+            state,
             expected_status,
-            comment.body,
+            comment,
         )
 
         for expected_msg in expected_msgs:
-            assert expected_msg in comment.body
+            assert expected_msg in comment